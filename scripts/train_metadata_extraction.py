@@ -12,18 +12,138 @@ import csv        # Módulo para leer y escribir archivos CSV (Comma Separated V
 import os         # Módulo para interactuar con el sistema operativo (rutas de archivos, comprobar si existen directorios, etc.).
 import argparse   # Módulo para manejar argumentos pasados por terminal (ej. --input folder_path).
 import logging    # Módulo para registrar mensajes (logs) en lugar de usar simples 'print', útil para saber qué pasa durante la ejecución.
-from typing import Optional, Dict, Any # Herramientas para indicar el tipo de dato que usan y devuelven las variables (ayuda al autocompletado y a leer el código).
+import shutil     # Módulo de utilidades de ficheros; usamos shutil.which() para encontrar dónde está instalado ffprobe.
+from collections import deque # Cola doble: la usamos para guardar en orden los ffprobe que están "en vuelo".
+from concurrent.futures import Future, ThreadPoolExecutor # Pool de hilos para lanzar varios ffprobe a la vez en lugar de uno detrás de otro.
+from typing import Optional, Dict, Callable, Iterable, Iterator, Tuple # Herramientas para indicar el tipo de dato que usan y devuelven las variables (ayuda al autocompletado y a leer el código).
 from tqdm import tqdm # Módulo para mostrar una barra de progreso visual en la consola mientras procesamos los videos.
+from tqdm.contrib.logging import logging_redirect_tqdm # Hace que los logs se impriman "por encima" de la barra de progreso sin romperla.
+
+# orjson es opcional: es un parser de JSON escrito en Rust, varias veces más rápido que el módulo 'json' estándar.
+# Además acepta directamente los bytes que devuelve subprocess, sin tener que decodificarlos antes a texto.
+# Si no está instalado, usamos json.loads() de la librería estándar (el resultado es exactamente el mismo).
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# PyAV (paquete 'av') es opcional: da acceso directo desde Python a las librerías de FFmpeg, sin lanzar ffprobe.
+# Si no está instalado, el script funciona igual usando ffprobe (solo falla si se pide --backend pyav).
+try:
+    import av
+except ImportError:
+    av = None
 
 # Configuración de logs
 # Configuramos cómo queremos que se vean los mensajes de información/error en la consola.
 # En este caso, mostraremos la fecha/hora, el nivel de importancia (INFO, ERROR) y el mensaje.
+# En las llamadas a logging pasamos los valores como argumentos ("... %s", valor) en lugar de usar f-strings: así el
+# texto solo se construye si el mensaje llega a mostrarse (por ejemplo, un logging.debug() desactivado no cuesta nada).
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def get_video_metadata(video_path: str) -> Dict[str, Any]:
+# Número de filas que acumulamos en memoria antes de volcarlas juntas al CSV con writer.writerows().
+# Escribir por bloques evita miles de llamadas pequeñas a writerow() (y a la escritura en disco).
+WRITE_BATCH_SIZE = 1000
+
+# Nombre de cada metadato, en el mismo orden en que aparecen en la tupla que devuelve get_video_metadata
+# (y por tanto en las columnas del CSV, justo después del 'Id').
+METADATA_FIELDS = ('duration', 'width', 'height', 'fps', 'has_audio', 'bitrate')
+
+# Tipo de la tupla de metadatos: (duration, width, height, fps, has_audio, bitrate).
+# Usamos una tupla y no un diccionario porque se construye más rápido, ocupa menos memoria y se puede pegar
+# directamente al 'Id' para formar la fila del CSV: (vid_id,) + metadatos.
+VideoMetadata = Tuple[Optional[float], Optional[int], Optional[int], Optional[float], int, Optional[int]]
+
+# Ruta completa al ejecutable de ffprobe, buscada una sola vez en el PATH al cargar el script (si no se encuentra dejamos
+# 'ffprobe' tal cual y subprocess dará el error de siempre). Con la ruta completa, y close_fds=False, Python puede usar
+# posix_spawn para lanzar cada ffprobe, que es bastante más barato que fork+exec cuando se lanzan miles de procesos.
+FFPROBE_BIN = shutil.which('ffprobe') or 'ffprobe'
+
+# Parte fija del comando de ffprobe (todo menos la ruta del video), construida una sola vez.
+FFPROBE_CMD = [
+    FFPROBE_BIN,              # El programa que vamos a ejecutar (debe estar instalado en el sistema).
+    '-v', 'quiet',            # '-v quiet' le dice a ffprobe que sea silencioso y no imprima su logo inicial o en la consola que molestarían al leer tras procesar.
+    '-print_format', 'json',  # Queremos que ffprobe devuelva la información de metadatos estrictamente en formato JSON, fácil de transformar en diccionario por Python.
+    # En vez de pedir TODO el formato y TODOS los campos de cada pista (-show_format -show_streams, varios KB de
+    # JSON por video), pedimos solo los campos que usamos. ffprobe trabaja menos y Python tiene muy poco que parsear:
+    #   - 'stream=...': de cada "stream" o pista (video, audio, subtítulos) solo su tipo, resolución y FPS.
+    #   - 'format=...': del contenedor del video solo la duración total y el bitrate global.
+    '-show_entries', 'stream=codec_type,width,height,r_frame_rate:format=duration,bit_rate',
+]
+
+# Valores que se devuelven cuando un video no se puede analizar: todo a None salvo has_audio, que vale 0.
+EMPTY_METADATA: VideoMetadata = (None, None, None, None, 0, None)
+
+def parse_ffprobe_output(output: bytes) -> VideoMetadata:
+    """
+    Convierte la salida JSON de ffprobe en la tupla de metadatos del video.
+
+    Como get_video_metadata pide a ffprobe solo unos campos concretos (-show_entries), el JSON siempre tiene la misma
+    forma y es muy pequeño, por ejemplo:
+        {"streams": [{"codec_type": "video", "width": 720, "height": 1280, "r_frame_rate": "30/1"},
+                     {"codec_type": "audio"}],
+         "format": {"duration": "12.345000", "bit_rate": "1234567"}}
+    Esta función recorre esa estructura de forma directa. Está separada de get_video_metadata para poder probarla o
+    reutilizarla sin tener que lanzar ffprobe.
+
+    Args:
+        output (bytes): Lo que ffprobe imprimió por su salida estándar.
+
+    Returns:
+        VideoMetadata: La tupla (duration, width, height, fps, has_audio, bitrate).
+
+    Raises:
+        ValueError, KeyError, ZeroDivisionError: Si el JSON está mal formado o algún valor no es un número válido.
+    """
+    # 'output' es texto crudo con formato JSON. Usamos json_loads() (orjson o json.loads) para convertir ese texto en un diccionario de Python.
+    info = json_loads(output)
+    
+    # --- 1. Información de formato general ---
+    # Extraemos la clave 'format' del diccionario. Si no existe usamos un diccionario {} vacío por seguridad.
+    fmt = info.get('format', {})
+    # Extraemos la duración y el bitrate (cantidad de datos por segundo).
+    # Los convertimos a números en Python (float para duración porque tiene decimales, int para bitrate).
+    duration = float(fmt.get('duration', 0))
+    bitrate = int(fmt.get('bit_rate', 0))
+    
+    # --- 2. Información de streams (pistas individualizadas) ---
+    # Un video suele tener una o varias pistas de imagen (video) y una o varias de sonido (audio).
+    # Recorremos la lista de pistas UNA sola vez y, en la misma pasada, nos quedamos con la primera pista de imagen
+    # ('codec_type' == 'video') y anotamos si hay alguna pista de sonido ('codec_type' == 'audio').
+    video_stream = None
+    has_audio = 0
+    for stream in info.get('streams', []):
+        codec_type = stream.get('codec_type')
+        if codec_type == 'video':
+            if video_stream is None:
+                video_stream = stream
+        elif codec_type == 'audio':
+            has_audio = 1
+    
+    # Si no hay pista de video, la resolución y los FPS se quedan a None.
+    width = height = fps = None
+
+    # Si nuestra búsqueda del stream de video nos dio contenido real...
+    if video_stream is not None:
+        width = int(video_stream.get('width', 0))
+        height = int(video_stream.get('height', 0))
+        
+        # --- Cálculo de FPS (Frames Per Second / Fotogramas Por Segundo) ---
+        # 'r_frame_rate' suele devolver fracciones como cadena de texto, ej. "30000/1001" (para 29.97 fps) o "24/1".
+        # partition('/') corta el texto por la primera '/' y devuelve siempre 3 partes: ("30000", "/", "1001").
+        # Es más rápido que split('/') porque no construye una lista, y si no hay '/' el separador 'sep' queda vacío.
+        num, sep, den = video_stream.get('r_frame_rate', '0/1').partition('/')
+        den = int(den) if sep else 0
+        
+        # Si hay denominador y no es 0, dividimos numerador por denominador y redondeamos a 2 decimales usando round().
+        fps = round(int(num) / den, 2) if den else 0
+
+    return (duration, width, height, fps, has_audio, bitrate)
+
+def get_video_metadata(video_path: str) -> VideoMetadata:
     """
     Extrae metadatos técnicos importantes de un archivo de video usando la herramienta externa 'ffprobe'.
 
@@ -31,93 +151,264 @@ def get_video_metadata(video_path: str) -> Dict[str, Any]:
         video_path (str): Ruta completa al archivo de video que queremos analizar.
 
     Returns:
-        Dict[str, Any]: Un diccionario con las características del video (metadatos). 
-                        En caso de que el video falle o no tenga algún dato, ese campo mantendrá su valor por defecto.
-    """
-    # Inicializamos un diccionario con valores nulos (None) o ceros.
-    # Si ffprobe falla o el video no tiene los datos, estos son los valores de seguridad que se devolverán.
-    metadata = {
-        'duration': None,
-        'width': None,
-        'height': None,
-        'fps': None,
-        'has_audio': 0,
-        'bitrate': None
-    }
-
+        VideoMetadata: Una tupla (duration, width, height, fps, has_audio, bitrate) con las características del video.
+                       Si el video no se puede analizar se devuelve EMPTY_METADATA (todo a None y has_audio a 0).
+    """
     try:
-        # Se define el comando de terminal que queremos ejecutar. 
+        # El comando es el prefijo fijo FFPROBE_CMD más la ruta del video como último argumento.
         #
         # ¿Por qué se pasa como una lista y no como un solo string continuo (ej. "ffprobe -v quiet ...")?
         # Porque el módulo 'subprocess' es más seguro si se le pasa una lista. De esta forma el sistema
         # operativo sabe claramente qué elemento es el programa principal ('ffprobe'), y delimita perfectamente 
         # cuáles son sus argumentos. Esto evita errores terribles si, por ejemplo, `video_path` tuviera 
         # espacios en su nombre de archivo (ej. "mi video.mp4").
-        cmd = [
-            'ffprobe',                # El programa que vamos a ejecutar (debe estar instalado en el sistema).
-            '-v', 'quiet',            # '-v quiet' le dice a ffprobe que sea silencioso y no imprima su logo inicial o en la consola que molestarían al leer tras procesar.
-            '-print_format', 'json',  # Queremos que ffprobe devuelva la información de metadatos estrictamente en formato JSON, fácil de transformar en diccionario por Python.
-            '-show_format',           # Pide información general del contenedor del video (duración total, tamaño en disco, bitrate global).
-            '-show_streams',          # Pide información detallada por separado de cada "stream" o pista (pista de video, pista de audio, subtítulos).
-            video_path                # El último argumento obligatorio de ffprobe es la ruta del archivo que va a ser inspeccionado.
-        ]
-        
-        # check_output ejecuta el cmd (lista de texto) en la consola silenciosamente y guarda lo que el programa imprime de vuelta en su salida estándar.
-        output = subprocess.check_output(cmd)
-        
-        # 'output' es texto crudo con formato JSON. Usamos json.loads() (load string) para convertir ese texto en un diccionario de Python.
-        info = json.loads(output)
-        
-        # --- 1. Información de formato general ---
-        # Extraemos la clave 'format' del diccionario. Si no existe usamos un diccionario {} vacío por seguridad.
-        fmt = info.get('format', {})
-        # Extraemos la duración y el bitrate (cantidad de datos por segundo).
-        # Los convertimos a números en Python (float para duración porque tiene decimales, int para bitrate).
-        metadata['duration'] = float(fmt.get('duration', 0))
-        metadata['bitrate'] = int(fmt.get('bit_rate', 0))
+        cmd = FFPROBE_CMD + [video_path]
         
-        # --- 2. Información de streams (pistas individualizadas) ---
-        # Un video suele tener una o varias pistas de imagen (video) y una o varias de sonido (audio).
-        streams = info.get('streams', [])
+        # subprocess.run ejecuta el cmd (lista de texto) en la consola silenciosamente y guarda lo que el programa imprime de vuelta en su salida estándar:
+        #   - stdout=subprocess.PIPE: capturamos la salida estándar (el JSON) para leerla desde Python.
+        #   - stderr=subprocess.DEVNULL: los mensajes de error de ffprobe se descartan directamente (con '-v quiet' no debería
+        #     haber ninguno) en lugar de heredar la consola del script.
+        #   - check=True: si ffprobe termina con error se lanza CalledProcessError, que capturamos más abajo.
+        #   - close_fds=False: permite a Python lanzar ffprobe con posix_spawn (junto con la ruta completa de FFPROBE_BIN),
+        #     que crea el proceso sin copiar la memoria del script. Es seguro: desde Python 3.4 los ficheros y tuberías que
+        #     abre Python no se heredan por defecto, así que un ffprobe no recibe las tuberías de los demás hilos.
+        output = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, close_fds=False
+        ).stdout
         
-        # Buscamos el stream encargado de la imagen ('codec_type' == 'video').
-        # La función nativa 'next()' itera sobre un bucle y te da el "siguiente" (o el primer) elemento que cumpla la condición.
-        # Aquí pasamos un iterador (s for s in streams si el codec_type es video). Si no entra ninguno, devuelve el "{}" de la derecha.
-        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), {})
-        
-        # Hacemos lo mismo para el 'audio'. Si no hay pista de audio, devolverá None en lugar de un diccionario vacío.
-        audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
-        
-        # Si nuestra búsqueda del stream de video nos dio contenido real...
-        if video_stream:
-            metadata['width'] = int(video_stream.get('width', 0))
-            metadata['height'] = int(video_stream.get('height', 0))
-            
-            # --- Cálculo de FPS (Frames Per Second / Fotogramas Por Segundo) ---
-            # 'r_frame_rate' suele devolver fracciones como cadena de texto, ej. "30000/1001" (para 29.97 fps) o "24/1".
-            # Hacemos un split('/') para convertir "30000/1001" en la lista ["30000", "1001"].
-            fps_parts = video_stream.get('r_frame_rate', '0/1').split('/')
-            
-            # Verificamos que se haya dividido exactamente en 2 partes (numerador y denominador) y que no vayamos a dividir por 0.
-            if len(fps_parts) == 2 and int(fps_parts[1]) != 0:
-                # Dividimos numerador por denominador y redondeamos a 2 decimales usando round().
-                metadata['fps'] = round(int(fps_parts[0]) / int(fps_parts[1]), 2)
-            else:
-                metadata['fps'] = 0
-                
-        # Si 'audio_stream' tuvo éxito al hacer su "next()", será diferente de None (por lo que guardará un 1 en nuestro diccionario, de lo contrario un 0).
-        metadata['has_audio'] = 1 if audio_stream else 0
+        return parse_ffprobe_output(output)
         
     except (subprocess.CalledProcessError, ValueError, KeyError, ZeroDivisionError) as e:
         # El bloque "try / except" atrapa cualquier error imprevisto (ej. archivo corrupto, dividir por 0 o fallo de permisos) y evita que
         # TODO el script que va procesando 1.000 videos, por ejemplo, detenga su flujo completo solo por 1 video malo.
-        # Simplemente guardamos un error log del video en concreto notificándonoslo.
-        logging.error(f"Error procesando {video_path}: {e}")
-    
-    # Devuelve el diccionario tanto si salió bien o como si saltó el error y se quedó en sus valores None basales.
-    return metadata
+        # Simplemente guardamos un error log del video en concreto notificándonoslo y devolvemos los valores por defecto.
+        logging.error("Error procesando %s: %s", video_path, e)
+        return EMPTY_METADATA
+
+def get_video_metadata_pyav(video_path: str) -> VideoMetadata:
+    """
+    Igual que get_video_metadata, pero leyendo el video con PyAV dentro del propio proceso de Python en lugar de lanzar
+    ffprobe. Nos ahorramos crear un proceso nuevo por video y codificar/decodificar el JSON intermedio.
+
+    Los valores salen iguales a los de ffprobe (misma duración redondeada a 6 decimales, mismo FPS "r_frame_rate" y
+    mismo bitrate del contenedor), así que los CSV y la caché son intercambiables entre ambos métodos.
+
+    Args:
+        video_path (str): Ruta completa al archivo de video que queremos analizar.
+
+    Returns:
+        VideoMetadata: La misma tupla que devuelve get_video_metadata (EMPTY_METADATA si el video no se puede analizar).
+    """
+    duration = width = height = fps = bitrate = None
+    has_audio = 0
 
-def process_videos(video_dir: str, output_csv: str) -> None:
+    try:
+        # 'with' cierra el contenedor (y el archivo) al terminar, igual que con open().
+        with av.open(video_path, metadata_errors='ignore') as container:
+            # container.duration viene en microsegundos (unidades de av.time_base); ffprobe lo imprime en segundos con 6 decimales.
+            duration = round(container.duration / av.time_base, 6) if container.duration else 0.0
+            bitrate = container.bit_rate or 0
+
+            # PyAV ya agrupa las pistas por tipo (container.streams.video / .audio), así que no hace falta recorrerlas:
+            # nos quedamos con la primera de video y miramos si hay alguna de audio.
+            video_streams = container.streams.video
+            video_stream = video_streams[0] if video_streams else None
+            has_audio = 1 if container.streams.audio else 0
+
+            # Si el FFmpeg que trae PyAV no tiene decodificador para la pista, 'codec_context' vale None (ffprobe sí
+            # sabría leer el ancho/alto). Lo comprobamos para no acabar en un AttributeError.
+            if video_stream is not None and video_stream.codec_context is not None:
+                width = video_stream.codec_context.width
+                height = video_stream.codec_context.height
+                # 'base_rate' es el equivalente en PyAV del 'r_frame_rate' de ffprobe (una fracción, ej. 30000/1001).
+                rate = video_stream.base_rate
+                fps = round(float(rate), 2) if rate else 0
+
+    except (av.error.FFmpegError, OSError, ValueError, ZeroDivisionError, AttributeError) as e:
+        # Igual que en get_video_metadata: un video malo no debe parar todo el proceso.
+        # Devolvemos EMPTY_METADATA y no lo que se hubiera leído hasta el fallo (ej. solo la duración): un resultado a
+        # medias con duración distinta de None acabaría guardado en la caché y no se volvería a analizar nunca.
+        logging.error("Error procesando %s: %s", video_path, e)
+        return EMPTY_METADATA
+
+    return (duration, width, height, fps, has_audio, bitrate)
+
+# Métodos disponibles para extraer los metadatos (se eligen con --backend).
+METADATA_BACKENDS = {
+    'ffprobe': get_video_metadata,
+    'pyav': get_video_metadata_pyav,
+}
+
+def metadata_cache_key(video_path: str) -> Optional[str]:
+    """
+    Construye la clave con la que se guarda un video en la caché de metadatos.
+
+    La clave combina la fecha de última modificación (en nanosegundos), el tamaño y el nombre del archivo. Si el video
+    se sustituye o se modifica, cambia su fecha o su tamaño y por tanto su clave: la entrada antigua simplemente deja
+    de usarse y el video se vuelve a analizar con ffprobe (la caché se invalida sola).
+
+    Usamos solo el nombre y no la ruta completa para que la caché siga sirviendo aunque la carpeta de videos se mueva
+    o se monte en otra ruta (ej. copiando el dataset a otro disco conservando las fechas).
+
+    Args:
+        video_path (str): Ruta completa al archivo de video.
+
+    Returns:
+        Optional[str]: La clave como texto (ej. "1712345678901234567:1048576:a.mp4"), o None si no se pudo
+                       consultar el archivo (en ese caso el video simplemente no se cachea).
+    """
+    try:
+        st = os.stat(video_path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}:{os.path.basename(video_path)}"
+
+def load_metadata_cache(cache_path: str) -> Dict[str, VideoMetadata]:
+    """
+    Carga la caché de metadatos guardada en una ejecución anterior.
+
+    Args:
+        cache_path (str): Ruta al fichero JSON de la caché.
+
+    Returns:
+        Dict[str, VideoMetadata]: Diccionario {clave de metadata_cache_key: tupla de metadatos}. Vacío si el fichero no
+                                  existe o está corrupto (en ese caso se avisa y se empieza de cero).
+    """
+    if not os.path.isfile(cache_path):
+        return {}
+    try:
+        # Leemos el fichero entero como bytes y lo parseamos con json_loads (orjson si está instalado, que es
+        # bastante más rápido que json.load con cachés de cientos de miles de videos).
+        with open(cache_path, 'rb') as fh:
+            cache = json_loads(fh.read())
+    except (OSError, ValueError) as e:
+        logging.warning("No se pudo leer la caché %s, se ignora: %s", cache_path, e)
+        return {}
+
+    # El fichero puede ser un JSON válido pero no una caché (ej. --cache apuntando por error a otro .json con una lista).
+    if not isinstance(cache, dict):
+        logging.warning("La caché %s no tiene el formato esperado, se ignora", cache_path)
+        return {}
+
+    # JSON no tiene tuplas: los metadatos se guardan como listas y aquí los volvemos a convertir en tuplas.
+    # Las entradas con otro formato (por ejemplo, de una versión anterior del script) se descartan.
+    cache = {
+        key: tuple(meta) for key, meta in cache.items()
+        if isinstance(meta, list) and len(meta) == len(METADATA_FIELDS)
+    }
+    logging.info("Cargadas %d entradas de la caché %s", len(cache), cache_path)
+    return cache
+
+def save_metadata_cache(cache_path: str, cache: Dict[str, VideoMetadata]) -> None:
+    """
+    Guarda la caché de metadatos en disco para que la próxima ejecución no tenga que volver a lanzar ffprobe.
+
+    Args:
+        cache_path (str): Ruta al fichero JSON de la caché.
+        cache (Dict[str, VideoMetadata]): Diccionario {clave: tupla de metadatos} a guardar.
+    """
+    # Escribimos primero en un fichero temporal y después lo renombramos sobre el definitivo. os.replace() es atómico:
+    # si el script se corta a mitad de la escritura, la caché anterior sigue intacta en lugar de quedar corrupta.
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(cache, fh)
+    os.replace(tmp_path, cache_path)
+
+def iter_video_metadata(
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    cache: Optional[Dict[str, VideoMetadata]] = None,
+    extract: Callable[[str], VideoMetadata] = get_video_metadata
+) -> Iterator[VideoMetadata]:
+    """
+    Ejecuta get_video_metadata sobre muchos videos a la vez y va devolviendo los resultados en el mismo orden que 'paths'.
+
+    Args:
+        paths (Iterable[str]): Rutas de los videos a analizar (puede ser una lista o un generador).
+        workers (Optional[int]): Número de ffprobe que se ejecutan en paralelo. Si es None se usa os.cpu_count().
+        cache (Optional[Dict[str, VideoMetadata]]): Caché de metadatos (ver load_metadata_cache). Los videos que ya
+                                                     estén en ella no pasan por ffprobe, y los nuevos que se analicen
+                                                     bien se añaden. Si es None no se usa caché.
+        extract (Callable[[str], VideoMetadata]): Función que extrae los metadatos de un video
+                                                  (get_video_metadata o get_video_metadata_pyav).
+
+    Returns:
+        Iterator[VideoMetadata]: Un generador con la tupla de metadatos de cada video, en el orden de entrada.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    # Como mucho tenemos 'window' videos enviados al pool a la vez (los que se están procesando más unos pocos de reserva
+    # para que ningún hilo se quede parado). Así no creamos de golpe un "future" por cada uno de los 100.000 videos,
+    # y la memoria se mantiene constante por muy grande que sea la carpeta.
+    window = 4 * workers
+
+    # ¿Por qué hilos y no procesos (multiprocessing)? El trabajo pesado lo hace ffprobe, que ya es un proceso aparte
+    # con su propio núcleo de CPU. Cada hilo solo lo lanza y espera su salida (durante esa espera Python libera el GIL),
+    # así que varios hilos bastan para tener varios ffprobe trabajando a la vez. Los hilos del pool se crean una sola vez y
+    # se reutilizan para todos los videos, y con procesos solo añadiríamos el coste de arrancar intérpretes de Python y
+    # de copiar (pickle) cada resultado de vuelta al proceso principal.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 'pending' guarda los trabajos en el orden en que se enviaron; siempre sacamos el más antiguo (popleft)
+        # para que el resultado salga en el mismo orden que 'paths'.
+        # Cada elemento es una pareja (clave de caché, future).
+        pending = deque()
+
+        def collect() -> VideoMetadata:
+            # Saca el trabajo más antiguo. .result() espera (si hace falta) a que termine ese ffprobe, mientras los
+            # demás siguen trabajando. Si el video se analizó bien (duration, meta[0], no es None) lo guardamos en la caché.
+            key, future = pending.popleft()
+            meta = future.result()
+            if key is not None and meta[0] is not None:
+                cache[key] = meta
+            return meta
+
+        for path in paths:
+            key = metadata_cache_key(path) if cache is not None else None
+            cached = cache.get(key) if key is not None else None
+            if cached is not None:
+                # Acierto de caché: no hace falta lanzar ffprobe. Creamos un Future ya resuelto para que el video
+                # conserve su sitio en la cola y el orden de salida no cambie.
+                future = Future()
+                future.set_result(cached)
+            else:
+                future = executor.submit(extract, path)
+            pending.append((key, future))
+            if len(pending) >= window:
+                yield collect()
+
+        # Vaciamos los que quedan pendientes al final.
+        while pending:
+            yield collect()
+
+def iter_mp4_entries(video_dir: str) -> Iterator[os.DirEntry]:
+    """
+    Recorre una carpeta y va devolviendo, uno a uno, los archivos '.mp4' que contiene (ignorando mayúsculas/minúsculas).
+
+    Es un generador: en lugar de construir primero una lista con todos los nombres de la carpeta y filtrarla después,
+    cada archivo se lee, se filtra y se entrega en el mismo paso, así que solo hay un nombre "vivo" a la vez.
+
+    Args:
+        video_dir (str): Carpeta con los videos.
+
+    Returns:
+        Iterator[os.DirEntry]: Generador de objetos DirEntry (con 'entry.name' y 'entry.path') de cada video.
+    """
+    # os.scandir() recorre la carpeta de forma plana (sin entrar en subcarpetas) y devuelve objetos "DirEntry" en lugar de
+    # simples nombres: cada uno trae ya su nombre ('entry.name'), su ruta completa ('entry.path') y el tipo de fichero que
+    # el sistema operativo nos dio al leer la carpeta, así que is_file() no necesita una llamada extra al disco.
+    with os.scandir(video_dir) as it:
+        for entry in it:
+            # Solo pasamos a minúsculas los 4 últimos caracteres (la extensión) y no el nombre entero.
+            if entry.name[-4:].lower() == '.mp4' and entry.is_file():
+                yield entry
+
+def process_videos(
+    video_dir: str,
+    output_csv: str,
+    workers: Optional[int] = None,
+    cache_path: Optional[str] = None,
+    backend: str = 'ffprobe'
+) -> None:
     """
     Recorre todos los videos MP4 de una carpeta, extrae su información usando la función individual
     get_video_metadata y guarda los resultados ordenadamente en el archivo CSV dado.
@@ -125,53 +416,88 @@ def process_videos(video_dir: str, output_csv: str) -> None:
     Args:
         video_dir (str): Directorio donde están los videos físicamente.
         output_csv (str): Ruta completa donde queremos guardar nuestro archivo .csv al construirlo.
+        workers (Optional[int]): Número de llamadas a ffprobe que se ejecutan en paralelo.
+                                 Si es None se usa el número de núcleos de la máquina (os.cpu_count()).
+        cache_path (Optional[str]): Fichero JSON donde se guardan los metadatos ya extraídos, para que al volver a
+                                    ejecutar el script los videos que no han cambiado no pasen otra vez por ffprobe.
+                                    Si es None no se usa caché.
+        backend (str): Método de extracción: 'ffprobe' (por defecto) o 'pyav' (requiere tener instalado PyAV).
     """
     # Primero, comprobamos que la carpeta que nos han pasado realmente existe en el disco duro.
     if not os.path.exists(video_dir):
-        logging.error(f"El directorio de videos no existe: {video_dir}")
+        logging.error("El directorio de videos no existe: %s", video_dir)
+        return
+
+    # Si nos piden PyAV pero no está instalado, avisamos y paramos antes de empezar.
+    if backend == 'pyav' and av is None:
+        logging.error("Se ha pedido --backend pyav pero PyAV no está instalado (pip install av)")
         return
 
-    # Usamos list comprehension para crear una lista solo con los archivos que terminan en '.mp4' ignorando mayúsculas/minúsculas.
-    # os.listdir() devuelve TODOS los archivos que encuentre indiscriminadamente de manera alfabética pero plana. 
-    files = [f for f in os.listdir(video_dir) if f.lower().endswith('.mp4')]
-    logging.info(f"Encontrados {len(files)} archivos .mp4 en {video_dir}")
+    # Guardamos en una lista los archivos '.mp4' de la carpeta. Aunque iter_mp4_entries() es un generador, aquí sí
+    # necesitamos la lista completa: para saber cuántos videos hay (el log y el 100% de la barra de progreso) y para
+    # recorrerlos a la vez que sus resultados.
+    entries = list(iter_mp4_entries(video_dir))
+    logging.info("Encontrados %d archivos .mp4 en %s", len(entries), video_dir)
+
+    # Cargamos la caché de ejecuciones anteriores (si se ha pedido usarla).
+    cache = load_metadata_cache(cache_path) if cache_path else None
 
     # Abrimos (o creamos) un archivo CSV en modo escritura de datos ('w' == write).
     # Usar el bloque 'with' asegura que el sistema operativo cerrará correctamente y liberará el archivo al 
     # terminar su iteración interna aunque salte algún error por el camino (muy vital a nivel de memoria).
     # 'newline=\'\'' previene la inyección de líneas dobles fantasma en sistemas como Windows que usan \r\n de salto de línea en ficheros.
-    with open(output_csv, 'w', newline='', encoding='utf-8') as out:
-        # El csv.writer facilita insertar listas (celdas separadas por comas) al archivo final
-        writer = csv.writer(out)
+    # 'buffering=1 << 20' reserva un búfer de 1 MiB, de modo que el sistema operativo recibe pocas escrituras grandes.
+    # logging_redirect_tqdm() hace que, mientras dure el bloque, los mensajes de log (ej. "Error procesando ...") se
+    # escriban con tqdm.write(): aparecen encima de la barra de progreso en lugar de partirla por la mitad.
+    with open(output_csv, 'w', newline='', encoding='utf-8', buffering=1 << 20) as out, logging_redirect_tqdm():
+        # El bloque try/finally garantiza que la caché se guarde aunque el proceso se interrumpa a mitad (Ctrl+C, un error
+        # inesperado...): así, al relanzar el script, los videos ya analizados no vuelven a pasar por ffprobe.
+        # Va dentro del 'with' a propósito: si el CSV no se puede crear (ej. la carpeta de salida no existe), el error
+        # que ve el usuario es ese y no otro posterior al intentar guardar la caché en esa misma carpeta.
+        try:
+            # El csv.writer facilita insertar listas (celdas separadas por comas) al archivo final
+            writer = csv.writer(out)
         
-        # Escribimos nuestra primera celda de cabeceras en el excel/CSV directamente
-        writer.writerow(['Id', 'duration', 'width', 'height', 'fps', 'has_audio', 'bitrate'])
+            # Escribimos nuestra primera celda de cabeceras en el excel/CSV directamente
+            writer.writerow(('Id',) + METADATA_FIELDS)
+
+            # Casi todo el tiempo de cada video se va en arrancar ffprobe y esperar su respuesta, y cada video es independiente
+            # del resto. Por eso repartimos las llamadas entre varios hilos: mientras un ffprobe trabaja, los demás también.
+            # iter_video_metadata() devuelve los resultados en el MISMO orden que 'paths' (aunque terminen desordenados), así que
+            # el CSV sale idéntico al que se obtenía procesando los videos de uno en uno.
+            # 'entry.path' ya es la ruta completa del video (carpeta + nombre). Se la pasamos como generador, sin crear una
+            # segunda lista con todas las rutas: iter_video_metadata() las va pidiendo a medida que las necesita.
+            paths = (e.path for e in entries)
+            results = iter_video_metadata(paths, workers, cache, METADATA_BACKENDS[backend])
+
+            # Aquí vamos acumulando las filas hasta tener WRITE_BATCH_SIZE y entonces las escribimos todas de golpe.
+            rows = []
         
-        # Empezamos el bucle. 'tqdm(files)' "envuelve" la lista 'files' y sirve para que nuestro script nos
-        # dibuje e informe una preciosa barra de carga bonita por la consola mientra vamos del %0 al %100 de ficheros.
-        for f in tqdm(files, desc="Extrayendo metadatos"):
-            # Obtenemos el "ID único" del video partiendo la extensión original de éste. Ejemplo: "video_42.mp4" -> separamos solo en "video_42"
-            vid_id = os.path.splitext(f)[0]
-            
-            # Formamos de manera limpia, independientemente del SO (Linux/Win/Mac), la ruta absoluta final del video en base a su carpeta y nombre propio.
-            path = os.path.join(video_dir, f)
+            # Empezamos el bucle. 'tqdm(...)' "envuelve" los resultados y sirve para que nuestro script nos
+            # dibuje e informe una preciosa barra de carga bonita por la consola mientra vamos del %0 al %100 de ficheros.
+            for entry, meta in tqdm(zip(entries, results), total=len(entries), desc="Extrayendo metadatos"):
+                # Obtenemos el "ID único" del video quitándole la extensión. Ejemplo: "video_42.mp4" -> "video_42".
+                # Como solo hemos aceptado archivos que terminan en '.mp4', basta con recortar los 4 últimos caracteres
+                # (más rápido que os.path.splitext(), que tiene que buscar dónde empieza la extensión).
+                vid_id = entry.name[:-4]
             
-            # Llamamos a nuestra función principal delegándole la ruta específica del iterador en el bucle en este mismo instante.
-            meta = get_video_metadata(path)
-            
-            # Escribimos los metadatos devueltos como una nueva línea para el final (append literal de writerow) de nuestro documento CSV.
-            writer.writerow([
-                vid_id, 
-                meta['duration'], 
-                meta['width'], 
-                meta['height'], 
-                meta['fps'], 
-                meta['has_audio'], 
-                meta['bitrate']
-            ])
+                # Añadimos los metadatos devueltos como una nueva fila pendiente de escribir en nuestro documento CSV.
+                # La tupla de metadatos ya viene en el orden de las columnas, así que basta con ponerle delante el 'Id'.
+                # Solo el hilo principal escribe en el fichero, así las líneas nunca se mezclan entre sí.
+                rows.append((vid_id,) + meta)
+                if len(rows) >= WRITE_BATCH_SIZE:
+                    writer.writerows(rows)
+                    rows.clear()
+
+            # Escribimos las últimas filas que hayan quedado en el búfer (menos de WRITE_BATCH_SIZE).
+            writer.writerows(rows)
+        finally:
+            # Guardamos la caché actualizada para la próxima ejecución.
+            if cache is not None:
+                save_metadata_cache(cache_path, cache)
 
     # Cuando salimos del bloque "with", el log nos avisa de lo que ocurrió y del estado.
-    logging.info(f"Extracción completada. Resultados guardados en: {output_csv}")
+    logging.info("Extracción completada. Resultados guardados en: %s", output_csv)
 
 def main():
     """
@@ -200,6 +526,34 @@ def main():
         default=os.path.join(DATA_ROOT, "processed", "train_metadata.csv"),
         help="Archivo CSV de salida"
     )
+
+    # Añadimos "--workers" para decidir cuántos ffprobe se lanzan a la vez (por defecto, uno por núcleo).
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Número de procesos ffprobe en paralelo (por defecto: os.cpu_count())"
+    )
+
+    # Añadimos "--cache" y "--no-cache" para controlar la caché de metadatos entre ejecuciones.
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Fichero JSON de caché de metadatos (por defecto: junto al CSV de salida, con extensión .cache.json)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No leer ni guardar la caché: todos los videos pasan por ffprobe"
+    )
+
+    # Añadimos "--backend" para elegir entre lanzar ffprobe o leer los videos directamente con PyAV.
+    parser.add_argument(
+        "--backend",
+        choices=sorted(METADATA_BACKENDS),
+        default="ffprobe",
+        help="Método de extracción de metadatos: 'ffprobe' (por defecto) o 'pyav' (más rápido, requiere PyAV)"
+    )
     
     # El parse_args() es la función encarga de "leer tu teclado/consola" lo que el usuario ha solicitado 
     # en la ejecución, y crea un objeto "args" donde:
@@ -207,8 +561,11 @@ def main():
     #   'args.output' guarda la ruta output.
     args = parser.parse_args()
     
+    # Si no nos dan una ruta para la caché, la colocamos junto al CSV (ej. train_metadata.csv -> train_metadata.cache.json).
+    cache_path = None if args.no_cache else (args.cache or os.path.splitext(args.output)[0] + ".cache.json")
+
     # Llamamos a la lógica principal.
-    process_videos(args.input, args.output)
+    process_videos(args.input, args.output, args.workers, cache_path, args.backend)
 
 # En Python, "__name__" es una variable especial. 
 # Si el script se ejecuta de frente con "python script.py", Python le asgina al script de forma interna el nombre especial "__main__".
@@ -36,12 +36,29 @@ import subprocess
 import json
 import csv
 import os
+import shutil
 import sys
 import argparse
 import logging
-from typing import Dict, Any
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Callable, Iterable, Iterator, Optional, Tuple
 
 from tqdm import tqdm
+from tqdm.contrib.logging import logging_redirect_tqdm
+
+# orjson es opcional: parser de JSON mas rapido que el estandar y que acepta
+# bytes directamente. Si no esta instalado se usa json.loads.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# PyAV es opcional: solo se necesita con --backend pyav
+try:
+    import av
+except ImportError:
+    av = None
 
 # ---------------------------------------------------------------------------
 # Logging
@@ -51,6 +68,17 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
+# Filas acumuladas en memoria antes de volcarlas al CSV con writerows()
+WRITE_BATCH_SIZE = 1000
+
+# Orden de los campos de la tupla de metadatos (y de las columnas del CSV)
+METADATA_FIELDS = ("duration", "width", "height", "fps", "has_audio", "bitrate")
+
+# (duration, width, height, fps, has_audio, bitrate)
+VideoMetadata = Tuple[
+    Optional[float], Optional[int], Optional[int], Optional[float], int, Optional[int]
+]
+
 
 # ---------------------------------------------------------------------------
 # Carga de etiquetas ECR
@@ -109,7 +137,71 @@ def load_ecr_labels(labels_path: str) -> Dict[str, str]:
 # ---------------------------------------------------------------------------
 # Extraccion de metadatos con ffprobe (identica a train_metadata_extraction.py)
 # ---------------------------------------------------------------------------
-def get_video_metadata(video_path: str) -> Dict[str, Any]:
+# ffprobe con ruta absoluta, resuelta una sola vez: junto con close_fds=False
+# permite a subprocess lanzarlo con posix_spawn en lugar de fork+exec
+FFPROBE_BIN = shutil.which("ffprobe") or "ffprobe"
+
+# Prefijo fijo del comando (solo falta la ruta del video)
+FFPROBE_CMD = [
+    FFPROBE_BIN,
+    "-v", "quiet",
+    "-print_format", "json",
+    # Solo los campos que se usan (en lugar de -show_format -show_streams)
+    "-show_entries",
+    "stream=codec_type,width,height,r_frame_rate:format=duration,bit_rate",
+]
+
+# Resultado para videos que no se pueden analizar
+EMPTY_METADATA: VideoMetadata = (None, None, None, None, 0, None)
+
+
+def parse_ffprobe_output(output: bytes) -> VideoMetadata:
+    """
+    Convierte la salida JSON de ffprobe (restringida con ``-show_entries``)
+    en la tupla de metadatos.
+
+    Args:
+        output: Salida estandar de ffprobe.
+
+    Returns:
+        Tupla (duration, width, height, fps, has_audio, bitrate).
+
+    Raises:
+        ValueError, KeyError, ZeroDivisionError: Si el JSON o algun valor
+            numerico no es valido.
+    """
+    info = json_loads(output)
+
+    # Informacion de formato general
+    fmt = info.get("format", {})
+    duration = float(fmt.get("duration", 0))
+    bitrate = int(fmt.get("bit_rate", 0))
+
+    # Streams: una sola pasada para el primer video y la presencia de audio
+    video_stream = None
+    has_audio = 0
+    for stream in info.get("streams", []):
+        codec_type = stream.get("codec_type")
+        if codec_type == "video":
+            if video_stream is None:
+                video_stream = stream
+        elif codec_type == "audio":
+            has_audio = 1
+
+    width = height = fps = None
+    if video_stream is not None:
+        width = int(video_stream.get("width", 0))
+        height = int(video_stream.get("height", 0))
+
+        # r_frame_rate es una fraccion "num/den" (ej. "30000/1001")
+        num, sep, den = video_stream.get("r_frame_rate", "0/1").partition("/")
+        den = int(den) if sep else 0
+        fps = round(int(num) / den, 2) if den else 0
+
+    return (duration, width, height, fps, has_audio, bitrate)
+
+
+def get_video_metadata(video_path: str) -> VideoMetadata:
     """
     Extrae metadatos tecnicos de un archivo de video usando ffprobe.
 
@@ -117,67 +209,242 @@ def get_video_metadata(video_path: str) -> Dict[str, Any]:
         video_path: Ruta completa al archivo de video.
 
     Returns:
-        Diccionario con claves: duration, width, height, fps, has_audio,
-        bitrate.  Los valores seran None/0 si ffprobe falla.
+        Tupla (duration, width, height, fps, has_audio, bitrate), en el
+        orden de ``METADATA_FIELDS``. ``EMPTY_METADATA`` si ffprobe falla.
     """
-    metadata: Dict[str, Any] = {
-        "duration": None,
-        "width": None,
-        "height": None,
-        "fps": None,
-        "has_audio": 0,
-        "bitrate": None,
-    }
-
     try:
-        cmd = [
-            "ffprobe",
-            "-v", "quiet",
-            "-print_format", "json",
-            "-show_format",
-            "-show_streams",
-            video_path,
-        ]
-        output = subprocess.check_output(cmd)
-        info = json.loads(output)
-
-        # Informacion de formato general
-        fmt = info.get("format", {})
-        metadata["duration"] = float(fmt.get("duration", 0))
-        metadata["bitrate"] = int(fmt.get("bit_rate", 0))
-
-        # Streams
-        streams = info.get("streams", [])
-        video_stream = next(
-            (s for s in streams if s.get("codec_type") == "video"), {}
-        )
-        audio_stream = next(
-            (s for s in streams if s.get("codec_type") == "audio"), None
-        )
+        # close_fds=False es seguro: Python crea sus descriptores como no
+        # heredables (PEP 446), asi que ningun ffprobe recibe las tuberias de
+        # los demas hilos.
+        output = subprocess.run(
+            FFPROBE_CMD + [video_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            close_fds=False,
+        ).stdout
+        return parse_ffprobe_output(output)
 
-        if video_stream:
-            metadata["width"] = int(video_stream.get("width", 0))
-            metadata["height"] = int(video_stream.get("height", 0))
+    except (
+        subprocess.CalledProcessError,
+        ValueError,
+        KeyError,
+        ZeroDivisionError,
+    ) as e:
+        logging.error("Error procesando %s: %s", video_path, e)
+        return EMPTY_METADATA
 
-            fps_parts = video_stream.get("r_frame_rate", "0/1").split("/")
-            if len(fps_parts) == 2 and int(fps_parts[1]) != 0:
-                metadata["fps"] = round(
-                    int(fps_parts[0]) / int(fps_parts[1]), 2
-                )
-            else:
-                metadata["fps"] = 0
 
-        metadata["has_audio"] = 1 if audio_stream else 0
+def get_video_metadata_pyav(video_path: str) -> VideoMetadata:
+    """
+    Variante de ``get_video_metadata`` que lee el contenedor con PyAV dentro
+    del proceso, sin lanzar ffprobe.
+
+    Devuelve los mismos valores que ffprobe (duracion redondeada a 6
+    decimales, FPS a partir de ``r_frame_rate``/``base_rate`` y bitrate del
+    contenedor), por lo que CSV y cache son intercambiables.
+
+    Args:
+        video_path: Ruta completa al archivo de video.
+
+    Returns:
+        La misma tupla que ``get_video_metadata`` (``EMPTY_METADATA`` si
+        el video no se puede analizar).
+    """
+    duration = width = height = fps = bitrate = None
+    has_audio = 0
+
+    try:
+        with av.open(video_path, metadata_errors="ignore") as container:
+            # container.duration esta en unidades de av.time_base (microsegundos)
+            duration = (
+                round(container.duration / av.time_base, 6)
+                if container.duration else 0.0
+            )
+            bitrate = container.bit_rate or 0
+
+            # PyAV ya agrupa las pistas por tipo
+            video_streams = container.streams.video
+            video_stream = video_streams[0] if video_streams else None
+            has_audio = 1 if container.streams.audio else 0
+
+            # codec_context es None si PyAV no tiene decodificador para la pista
+            if video_stream is not None and video_stream.codec_context is not None:
+                width = video_stream.codec_context.width
+                height = video_stream.codec_context.height
+                rate = video_stream.base_rate
+                fps = round(float(rate), 2) if rate else 0
 
     except (
-        subprocess.CalledProcessError,
+        av.error.FFmpegError,
+        OSError,
         ValueError,
-        KeyError,
         ZeroDivisionError,
+        AttributeError,
     ) as e:
+        # Nada de resultados a medias: acabarian guardados en la cache
         logging.error("Error procesando %s: %s", video_path, e)
+        return EMPTY_METADATA
+
+    return (duration, width, height, fps, has_audio, bitrate)
+
+
+# Metodos de extraccion disponibles (--backend)
+METADATA_BACKENDS = {
+    "ffprobe": get_video_metadata,
+    "pyav": get_video_metadata_pyav,
+}
+
+
+# ---------------------------------------------------------------------------
+# Cache de metadatos entre ejecuciones
+# ---------------------------------------------------------------------------
+def metadata_cache_key(video_path: str) -> Optional[str]:
+    """
+    Clave de cache de un video: mtime (ns), tamano y nombre del fichero.
+
+    Si el fichero cambia, cambia su clave y la entrada antigua deja de
+    usarse, de modo que la cache se invalida sola. Se usa el nombre y no la
+    ruta completa para que la cache siga valiendo si el dataset se mueve.
+
+    Args:
+        video_path: Ruta completa al archivo de video.
+
+    Returns:
+        La clave como string, o None si no se puede hacer ``stat`` del
+        fichero (en cuyo caso no se cachea).
+    """
+    try:
+        st = os.stat(video_path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}:{os.path.basename(video_path)}"
+
+
+def load_metadata_cache(cache_path: str) -> Dict[str, VideoMetadata]:
+    """
+    Carga la cache de metadatos de una ejecucion anterior.
+
+    Args:
+        cache_path: Ruta al fichero JSON de cache.
+
+    Returns:
+        Diccionario {clave: tupla de metadatos}. Vacio si el fichero no
+        existe o no se puede leer.
+    """
+    if not os.path.isfile(cache_path):
+        return {}
+    try:
+        with open(cache_path, "rb") as fh:
+            cache = json_loads(fh.read())
+    except (OSError, ValueError) as e:
+        logging.warning("No se pudo leer la cache %s, se ignora: %s", cache_path, e)
+        return {}
+    if not isinstance(cache, dict):
+        logging.warning("La cache %s no tiene el formato esperado, se ignora", cache_path)
+        return {}
+
+    # JSON guarda las tuplas como listas; se descartan entradas con otro formato
+    cache = {
+        key: tuple(meta) for key, meta in cache.items()
+        if isinstance(meta, list) and len(meta) == len(METADATA_FIELDS)
+    }
+    logging.info("Cargadas %d entradas de la cache %s", len(cache), cache_path)
+    return cache
+
+
+def save_metadata_cache(cache_path: str, cache: Dict[str, VideoMetadata]) -> None:
+    """
+    Guarda la cache de metadatos en disco.
+
+    Args:
+        cache_path: Ruta al fichero JSON de cache.
+        cache:      Diccionario {clave: tupla de metadatos}.
+    """
+    # Escritura atomica: un corte a mitad no deja la cache corrupta
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(cache, fh)
+    os.replace(tmp_path, cache_path)
+
+
+def iter_video_metadata(
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    cache: Optional[Dict[str, VideoMetadata]] = None,
+    extract: Callable[[str], VideoMetadata] = get_video_metadata,
+) -> Iterator[VideoMetadata]:
+    """
+    Aplica get_video_metadata a ``paths`` en paralelo, devolviendo los
+    resultados en el mismo orden de entrada.
+
+    Como mucho hay ``4 * workers`` videos enviados al pool a la vez, de modo
+    que la memoria no crece con el numero de videos del directorio.
+
+    Se usan hilos y no procesos: cada hilo solo lanza ffprobe (un proceso
+    aparte) y espera su salida sin retener el GIL. Los hilos del pool se
+    reutilizan para todos los videos, y un pool de procesos solo anadiria el
+    arranque de interpretes y el pickle de cada resultado.
+
+    Args:
+        paths:   Rutas de los videos (lista o generador).
+        workers: Numero de ffprobe en paralelo (por defecto ``os.cpu_count()``).
+        cache:   Cache de metadatos (ver ``load_metadata_cache``). Los aciertos
+                 no pasan por ffprobe y los videos analizados con exito se
+                 anaden. None desactiva la cache.
+        extract: Funcion de extraccion (``get_video_metadata`` o
+                 ``get_video_metadata_pyav``).
+
+    Yields:
+        Tupla de metadatos de cada video, en el orden de ``paths``.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = 4 * workers
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()  # parejas (clave de cache, future)
+
+        def collect() -> VideoMetadata:
+            key, future = pending.popleft()
+            meta = future.result()
+            if key is not None and meta[0] is not None:  # duration
+                cache[key] = meta
+            return meta
+
+        for path in paths:
+            key = metadata_cache_key(path) if cache is not None else None
+            cached = cache.get(key) if key is not None else None
+            if cached is not None:
+                # Future ya resuelto: conserva el orden sin lanzar ffprobe
+                future = Future()
+                future.set_result(cached)
+            else:
+                future = executor.submit(extract, path)
+            pending.append((key, future))
+            if len(pending) >= window:
+                yield collect()
 
-    return metadata
+        while pending:
+            yield collect()
+
+
+def iter_mp4_entries(video_dir: str) -> Iterator[os.DirEntry]:
+    """
+    Generador con los ficheros ``.mp4`` (sin distinguir mayusculas) de
+    ``video_dir``, leidos, filtrados y entregados en un solo paso.
+
+    Args:
+        video_dir: Directorio con los videos.
+
+    Yields:
+        ``os.DirEntry`` de cada video (con ``name`` y ``path`` resueltos).
+    """
+    # os.scandir devuelve DirEntry con nombre, ruta completa y tipo de
+    # fichero ya resueltos, sin un stat adicional por archivo.
+    with os.scandir(video_dir) as it:
+        for entry in it:
+            if entry.name[-4:].lower() == ".mp4" and entry.is_file():
+                yield entry
 
 
 # ---------------------------------------------------------------------------
@@ -187,6 +454,9 @@ def process_videos(
     video_dir: str,
     labels_path: str,
     output_csv: str,
+    workers: Optional[int] = None,
+    cache_path: Optional[str] = None,
+    backend: str = "ffprobe",
 ) -> None:
     """
     Recorre los videos MP4 de ``video_dir``, extrae metadatos con ffprobe,
@@ -203,21 +473,35 @@ def process_videos(
         video_dir:   Directorio con los .mp4.
         labels_path: CSV con columnas Id y ECR.
         output_csv:  Ruta de salida del CSV resultante.
+        workers:     Numero de llamadas a ffprobe en paralelo (por defecto
+                     ``os.cpu_count()``).
+        cache_path:  Fichero JSON de cache de metadatos entre ejecuciones.
+                     None desactiva la cache.
+        backend:     ``"ffprobe"`` (por defecto) o ``"pyav"`` (requiere PyAV).
     """
     if not os.path.isdir(video_dir):
         logging.error("El directorio de videos no existe: %s", video_dir)
         sys.exit(1)
 
+    if backend == "pyav" and av is None:
+        logging.error(
+            "Se ha pedido --backend pyav pero PyAV no esta instalado (pip install av)"
+        )
+        sys.exit(1)
+
     # 1. Cargar labels
     ecr_map = load_ecr_labels(labels_path)
 
     # 2. Listar videos
-    files = [f for f in os.listdir(video_dir) if f.lower().endswith(".mp4")]
-    files.sort()  # orden determinista para reproducibilidad
-    logging.info("Encontrados %d archivos .mp4 en %s", len(files), video_dir)
+    # Orden determinista para reproducibilidad (sorted consume el generador
+    # directamente, sin lista intermedia)
+    entries = sorted(iter_mp4_entries(video_dir), key=lambda e: e.name)
+    logging.info("Encontrados %d archivos .mp4 en %s", len(entries), video_dir)
 
     # 3. Construir conjuntos de Ids para deteccion de discrepancias
-    video_ids = {os.path.splitext(f)[0] for f in files}
+    # Todos los nombres terminan en ".mp4": el Id es el nombre sin los 4
+    # ultimos caracteres (sin pasar por os.path.splitext)
+    video_ids = {e.name[:-4] for e in entries}
     label_ids = set(ecr_map.keys())
 
     videos_sin_label = video_ids - label_ids
@@ -242,37 +526,57 @@ def process_videos(
         os.makedirs(output_dir, exist_ok=True)
 
     # 5. Procesar y escribir
+    # Solo se procesan los videos con etiqueta ECR; el resto se cuentan como
+    # omitidos sin llegar a lanzar ffprobe.
+    labelled = [e for e in entries if e.name[:-4] in ecr_map]
+    skipped = len(entries) - len(labelled)
     written = 0
-    skipped = 0
+    cache = load_metadata_cache(cache_path) if cache_path else None
+
+    # logging_redirect_tqdm: los logs emitidos durante el bucle (p.ej. errores
+    # de ffprobe desde los hilos) se escriben con tqdm.write y no rompen la
+    # barra de progreso.
+    with open(
+        output_csv, "w", newline="", encoding="utf-8", buffering=1 << 20
+    ) as out, logging_redirect_tqdm():
+        # try/finally: la cache se guarda aunque la ejecucion se interrumpa,
+        # de modo que al relanzar no se repiten los videos ya analizados. Va
+        # dentro del with para que un fallo al abrir el CSV no se tape con
+        # otro al guardar la cache.
+        try:
+            writer = csv.writer(out)
+            writer.writerow(("Id",) + METADATA_FIELDS + ("ECR",))
+
+            # ffprobe domina el tiempo por video y cada llamada es
+            # independiente: se lanzan en paralelo en hilos.
+            # iter_video_metadata conserva el orden de entrada, de modo que el
+            # CSV sigue siendo determinista, y solo el hilo principal escribe
+            # en el fichero.
+            paths = (e.path for e in labelled)
+            results = iter_video_metadata(
+                paths, workers, cache, METADATA_BACKENDS[backend]
+            )
 
-    with open(output_csv, "w", newline="", encoding="utf-8") as out:
-        writer = csv.writer(out)
-        writer.writerow(
-            ["Id", "duration", "width", "height", "fps", "has_audio", "bitrate", "ECR"]
-        )
+            # Las filas se escriben por bloques de WRITE_BATCH_SIZE
+            rows = []
+
+            for entry, meta in tqdm(
+                zip(labelled, results),
+                total=len(labelled),
+                desc="Extrayendo metadatos",
+            ):
+                vid_id = entry.name[:-4]
+
+                rows.append((vid_id,) + meta + (ecr_map[vid_id],))
+                written += 1
+                if len(rows) >= WRITE_BATCH_SIZE:
+                    writer.writerows(rows)
+                    rows.clear()
 
-        for f in tqdm(files, desc="Extrayendo metadatos"):
-            vid_id = os.path.splitext(f)[0]
-
-            # Solo procesar si tenemos etiqueta ECR
-            if vid_id not in ecr_map:
-                skipped += 1
-                continue
-
-            path = os.path.join(video_dir, f)
-            meta = get_video_metadata(path)
-
-            writer.writerow([
-                vid_id,
-                meta["duration"],
-                meta["width"],
-                meta["height"],
-                meta["fps"],
-                meta["has_audio"],
-                meta["bitrate"],
-                ecr_map[vid_id],
-            ])
-            written += 1
+            writer.writerows(rows)
+        finally:
+            if cache is not None:
+                save_metadata_cache(cache_path, cache)
 
     logging.info(
         "Extraccion completada: %d filas escritas, %d videos omitidos "
@@ -315,9 +619,48 @@ def main() -> None:
         default=os.path.join(DATA_ROOT, "processed", "val_metadata.csv"),
         help="Archivo CSV de salida con metadatos + ECR",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Numero de procesos ffprobe en paralelo (por defecto: os.cpu_count())",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help=(
+            "Fichero JSON de cache de metadatos "
+            "(por defecto: junto al CSV de salida, con extension .cache.json)"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No leer ni guardar la cache: todos los videos pasan por ffprobe",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=sorted(METADATA_BACKENDS),
+        default="ffprobe",
+        help=(
+            "Metodo de extraccion de metadatos: 'ffprobe' (por defecto) o "
+            "'pyav' (sin subprocesos, requiere PyAV)"
+        ),
+    )
     args = parser.parse_args()
 
-    process_videos(args.input, args.labels, args.output)
+    cache_path = None
+    if not args.no_cache:
+        cache_path = args.cache or os.path.splitext(args.output)[0] + ".cache.json"
+
+    process_videos(
+        args.input,
+        args.labels,
+        args.output,
+        args.workers,
+        cache_path,
+        args.backend,
+    )
 
 
 if __name__ == "__main__":